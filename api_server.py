@@ -5,6 +5,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import os
 import sys
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
 from uvicorn import run as uvicorn_run
 from typing import List
 
@@ -12,6 +15,16 @@ from typing import List
 sys.path.append(os.path.dirname(os.path.abspath(__file__))) 
 from src.query_data import run_rag_query 
 
+# --- Concurrency Configuration ---
+# The RAG pipeline is blocking (embedding + Qdrant + Gemini HTTP), so it runs
+# in a dedicated thread pool to keep the event loop free for other requests.
+RAG_MAX_WORKERS = int(os.getenv("RAG_MAX_WORKERS", "8"))
+# Each worker process loads its own embedding model and thread pool, so keep this small
+API_WORKERS = int(os.getenv("API_WORKERS", "2"))
+# Localhost by default: the endpoint is unauthenticated and CORS allows any origin
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+EXECUTOR = ThreadPoolExecutor(max_workers=RAG_MAX_WORKERS)
+
 # Initialize FastAPI application
 app = FastAPI(title="Medical RAG Analysis API")
 
@@ -33,17 +46,22 @@ class QueryRequest(BaseModel):
 
 # --- API Endpoint ---
 @app.post("/analyze")
-def analyze_medical_data(request: QueryRequest):
+async def analyze_medical_data(request: QueryRequest):
     """
     Endpoint to receive user query, target file, and persona, and run the RAG pipeline.
     """
     try:
-        # Call the core RAG function
-        final_report, nodes = run_rag_query(
-            request.user_query, 
-            request.file_path, 
-            request.persona,
-            top_k=20 
+        # Call the core RAG function off the event loop
+        loop = asyncio.get_running_loop()
+        final_report, nodes = await loop.run_in_executor(
+            EXECUTOR,
+            functools.partial(
+                run_rag_query,
+                request.user_query, 
+                request.file_path, 
+                request.persona,
+                top_k=20 
+            )
         )
         
         # Format nodes for JSON response
@@ -69,4 +87,14 @@ def analyze_medical_data(request: QueryRequest):
         raise HTTPException(status_code=500, detail=f"Internal RAG process failed: {e}")
 
 if __name__ == "__main__":
-    uvicorn_run(app, host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    # Multiple workers require the app to be passed as an import string.
+    # "auto" uses uvloop and httptools when installed (uvicorn[standard]) and falls back otherwise.
+    uvicorn_run(
+        "api_server:app",
+        host=API_HOST,
+        port=8000,
+        workers=API_WORKERS,
+        loop="auto",
+        http="auto",
+        log_level="info"
+    )
\ No newline at end of file
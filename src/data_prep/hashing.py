@@ -0,0 +1,21 @@
+import hashlib
+import mmap
+import os
+import uuid
+
+def hash_file_content(filepath: str) -> str:
+    """Generates a SHA-256 hash based on the file's binary content."""
+    try:
+        with open(filepath, 'rb') as f:
+            # Python 3.11+: hashing loop runs entirely in C with large reads
+            if hasattr(hashlib, 'file_digest'):
+                return hashlib.file_digest(f, 'sha256').hexdigest()
+
+            # Older Python: hand the whole mapped file to OpenSSL in one call
+            if os.fstat(f.fileno()).st_size == 0:
+                return hashlib.sha256().hexdigest()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return hashlib.sha256(mm).hexdigest()
+    except Exception as e:
+        print(f"Error hashing file {filepath}: {e}")
+        return str(uuid.uuid4())
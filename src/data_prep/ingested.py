@@ -0,0 +1,44 @@
+import os
+from qdrant_client import QdrantClient
+from qdrant_client.models import Filter, FieldCondition, MatchValue
+from dotenv import load_dotenv
+
+# --- CONFIGURATION & SETUP ---
+load_dotenv(dotenv_path='./config/.env')
+QDRANT_URL = os.getenv("QDRANT_URL")
+QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME")
+# gRPC is opt-in: it needs the gRPC port (6334 by default) published alongside 6333
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
+
+# Created lazily so each ingestion worker process opens its own connection
+QDRANT = None
+
+def is_already_ingested(doc_id: str, source: str) -> bool:
+    """
+    Returns True if a point with this 'id' and 'source' metadata already exists in Qdrant.
+    The source is checked too because retrieval filters by filename, so an identical file
+    under a new name must still be ingested. Chunk point IDs are assigned by the node parser,
+    so the lookup is by payload (both fields are indexed by the ingestion vector store).
+    Any lookup failure (e.g. missing collection) counts as not ingested.
+    """
+    global QDRANT
+    if not QDRANT_URL or not QDRANT_COLLECTION_NAME:
+        return False
+    try:
+        if QDRANT is None:
+            QDRANT = QdrantClient(url=QDRANT_URL, prefer_grpc=QDRANT_PREFER_GRPC, grpc_port=QDRANT_GRPC_PORT, timeout=30)
+        points, _ = QDRANT.scroll(
+            collection_name=QDRANT_COLLECTION_NAME,
+            scroll_filter=Filter(must=[
+                FieldCondition(key="id", match=MatchValue(value=doc_id)),
+                FieldCondition(key="source", match=MatchValue(value=source))
+            ]),
+            limit=1,
+            with_payload=False,
+            with_vectors=False
+        )
+        return bool(points)
+    except Exception as e:
+        print(f"Could not check Qdrant for existing document {doc_id}: {e}")
+        return False
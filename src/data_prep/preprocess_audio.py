@@ -1,9 +1,14 @@
 import os
+import tempfile
+import threading
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 import assemblyai as aai
 from llama_index.core.schema import Document
 from dotenv import load_dotenv
 import uuid
-import hashlib # 🟢 Added for File Hashing
+from src.data_prep.hashing import hash_file_content
+from src.data_prep.ingested import is_already_ingested
 
 # --- CONFIGURATION & SETUP ---
 load_dotenv(dotenv_path='./config/.env') 
@@ -12,17 +17,64 @@ ASSEMBLY_API_KEY = os.getenv("ASSEMBLY_API_KEY")
 if ASSEMBLY_API_KEY:
     aai.settings.api_key = ASSEMBLY_API_KEY
 
-def hash_file_content(filepath: str) -> str:
-    """Generates a SHA-256 hash based on the file's binary content."""
-    sha256 = hashlib.sha256()
+# Optional: pydub (+ ffmpeg) is only needed to split long recordings
+try:
+    from pydub import AudioSegment
+    from pydub.silence import detect_silence
+    from pydub.utils import mediainfo
+except ImportError:
+    AudioSegment = None
+
+CHUNK_LENGTH_MS = 10 * 60 * 1000 # Files longer than this are split and transcribed in parallel
+SILENCE_SEARCH_MS = 30 * 1000 # Window around each cut point searched for a pause
+MIN_CHUNK_MS = 30 * 1000 # Shorter trailing chunks are merged into the previous one
+TRANSCRIBE_MAX_WORKERS = 8
+MAX_CONCURRENT_TRANSCRIPTIONS = 8 # Process-wide cap on in-flight AssemblyAI jobs (all files)
+_TRANSCRIBE_SLOTS = threading.BoundedSemaphore(MAX_CONCURRENT_TRANSCRIPTIONS)
+TARGET_SAMPLE_RATE = 16000 # Long files are decoded as 16 kHz mono, sufficient for speech
+
+def get_duration_ms(filepath: str) -> Optional[float]:
+    """Returns the audio duration via ffprobe, or None if pydub/ffmpeg cannot read it."""
+    if AudioSegment is None:
+        return None
     try:
-        with open(filepath, 'rb') as f:
-            while chunk := f.read(8192):
-                sha256.update(chunk)
-        return sha256.hexdigest()
-    except Exception as e:
-        print(f"Error hashing file {filepath}: {e}")
-        return str(uuid.uuid4())
+        return float(mediainfo(filepath)['duration']) * 1000
+    except Exception:
+        return None
+
+def split_at_silence(audio: AudioSegment) -> list[AudioSegment]:
+    """
+    Splits audio into ~CHUNK_LENGTH_MS pieces, moving each cut to the middle of the
+    nearest pause (if any) so words are not cut in half.
+    """
+    if len(audio) <= CHUNK_LENGTH_MS:
+        return [audio]
+
+    cuts = [0]
+    while len(audio) - cuts[-1] > CHUNK_LENGTH_MS:
+        target = cuts[-1] + CHUNK_LENGTH_MS
+        window_start = max(cuts[-1] + 1, target - SILENCE_SEARCH_MS)
+        window = audio[window_start:target + SILENCE_SEARCH_MS]
+        silences = detect_silence(window, min_silence_len=500, silence_thresh=window.dBFS - 16)
+        if silences:
+            start, end = min(silences, key=lambda s: abs(window_start + (s[0] + s[1]) // 2 - target))
+            target = window_start + (start + end) // 2
+        cuts.append(target)
+    # A pause-snapped cut can leave a tiny tail; fold it into the previous chunk
+    if len(cuts) > 1 and len(audio) - cuts[-1] < MIN_CHUNK_MS:
+        cuts.pop()
+    cuts.append(len(audio))
+
+    return [audio[start:end] for start, end in zip(cuts, cuts[1:])]
+
+def transcribe_chunk(transcriber: aai.Transcriber, chunk_path: str) -> str:
+    """Transcribes a single audio chunk, raising on AssemblyAI errors."""
+    # Shared across every file's chunk pool, so the total stays rate limited
+    with _TRANSCRIBE_SLOTS:
+        transcript = transcriber.transcribe(chunk_path)
+    if transcript.status == aai.TranscriptStatus.error:
+        raise RuntimeError(transcript.error)
+    return (transcript.text or "").strip()
 
 def process_audio_file(filepath: str) -> list[Document]:
     """
@@ -36,26 +88,60 @@ def process_audio_file(filepath: str) -> list[Document]:
     # 🟢 FIX: Generate a stable ID based on the immutable audio file content
     file_hash = hash_file_content(filepath)
     deterministic_base_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, file_hash))
+
+    # Unchanged files keep the same ID, so skip the expensive API calls entirely
+    if is_already_ingested(deterministic_base_id, os.path.basename(filepath)):
+        print(f"Skipping {filepath}: already ingested.")
+        return []
     
     print(f"Transcribing audio file: {filepath} using AssemblyAI...")
     
     try:
         config = aai.TranscriptionConfig(language_code="en")
         transcriber = aai.Transcriber(config=config)
-        transcript = transcriber.transcribe(filepath)
 
-        if transcript.status == aai.TranscriptStatus.error:
-            print(f"AssemblyAI Error for {filepath}: {transcript.error}")
-            return []
-            
-        transcription = transcript.text.strip()
+        # Short files (or no ffmpeg available) are uploaded unchanged in a single job
+        duration_ms = get_duration_ms(filepath)
+        if duration_ms is None or duration_ms <= CHUNK_LENGTH_MS:
+            try:
+                texts = [transcribe_chunk(transcriber, filepath)]
+            except RuntimeError as e:
+                print(f"AssemblyAI Error for {filepath}: {e}")
+                return []
+        else:
+            # For compressed formats ffmpeg downmixes/resamples while decoding. pydub reads WAV
+            # directly and ignores these parameters, so the segment is normalized explicitly
+            # (WAVs are therefore briefly held at their native rate before conversion).
+            audio = AudioSegment.from_file(filepath, parameters=["-ac", "1", "-ar", str(TARGET_SAMPLE_RATE)])
+            audio = audio.set_channels(1).set_frame_rate(TARGET_SAMPLE_RATE)
+            chunks = split_at_silence(audio)
+            print(f"-> Split {filepath} into {len(chunks)} chunks.")
+
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                chunk_paths = []
+                for i, chunk in enumerate(chunks):
+                    # FLAC is lossless and compressed, keeping uploads small
+                    chunk_path = os.path.join(tmp_dir, f"chunk_{i:04d}.flac")
+                    chunk.export(chunk_path, format="flac")
+                    chunk_paths.append(chunk_path)
+                del audio, chunks
+
+                try:
+                    with ThreadPoolExecutor(max_workers=TRANSCRIBE_MAX_WORKERS) as ex:
+                        # map preserves chunk order for reassembly
+                        texts = list(ex.map(lambda path: transcribe_chunk(transcriber, path), chunk_paths))
+                except RuntimeError as e:
+                    print(f"AssemblyAI Error for {filepath}: {e}")
+                    return []
+
+        transcription = " ".join(text for text in texts if text)
         
         if not transcription:
             print(f"Transcription failed or was empty for {filepath}.")
             return []
             
         content = f"--- AssemblyAI Transcription ---\n{transcription}"
-        filename = filepath.split(os.sep)[-1]
+        filename = os.path.basename(filepath)
         
         document = Document(
             text=content, 
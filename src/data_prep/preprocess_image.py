@@ -1,36 +1,27 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
 import pytesseract
 from PIL import Image
 from llama_index.core.schema import Document
 from google import genai
 from dotenv import load_dotenv
-import hashlib 
+from src.data_prep.hashing import hash_file_content
+from src.data_prep.ingested import is_already_ingested
 import uuid 
 
 # --- CONFIGURATION & SETUP ---
 load_dotenv(dotenv_path='./config/.env')
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-def hash_file_content(filepath: str) -> str:
-    """Generates a SHA-256 hash based on the file's binary content."""
-    sha256 = hashlib.sha256()
-    try:
-        with open(filepath, 'rb') as f:
-            while chunk := f.read(8192):
-                sha256.update(chunk)
-        return sha256.hexdigest()
-    except Exception as e:
-        print(f"Error hashing file {filepath}: {e}")
-        return str(uuid.uuid4())
-
-def generate_image_caption_gemini(image_path: str) -> str:
-    # (Gemini captioning logic remains unchanged)
+def generate_image_caption_gemini(image_path: str, img: Image.Image = None) -> str:
+    # Reuses an already opened image when given, otherwise opens image_path
     if not GEMINI_API_KEY:
         print("Warning: GEMINI_API_KEY not set. Cannot use Gemini for captioning.")
         return ""
     try:
         client = genai.Client(api_key=GEMINI_API_KEY)
-        img = Image.open(image_path)
+        if img is None:
+            img = Image.open(image_path)
         prompt = (
             "Analyze this medical image (e.g., X-ray, ECG, MRI). "
             "Provide a concise, detailed description of the findings, including any "
@@ -54,28 +45,46 @@ def process_image_file(filepath: str) -> list[Document]:
     # 🟢 FIX: Use the hash of the immutable file content for the ID
     file_hash = hash_file_content(filepath)
     deterministic_base_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, file_hash))
+
+    # Unchanged files keep the same ID, so skip the expensive API calls entirely
+    if is_already_ingested(deterministic_base_id, os.path.basename(filepath)):
+        print(f"Skipping {filepath}: already ingested.")
+        return []
     
     ocr_text = ""
     caption_text = ""
     try:
-        ocr_text = pytesseract.image_to_string(Image.open(filepath))
-        ocr_text = f"OCR Text: {ocr_text.strip()}\n"
+        # Open and decode once so both workers share the same pixel data
+        img = Image.open(filepath)
+        img.load()
     except Exception as e:
-        # Note: Your error message "OCR failed..." is visible in the console output.
-        print(f"OCR failed for {filepath}: {e}")
+        print(f"Could not open image {filepath}: {e}")
+        return []
+
+    # OCR (Tesseract subprocess) and captioning (Gemini HTTP) are independent
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        ocr_future = ex.submit(pytesseract.image_to_string, img)
+        caption_future = ex.submit(generate_image_caption_gemini, filepath, img)
+
+        try:
+            ocr_text = ocr_future.result()
+            ocr_text = f"OCR Text: {ocr_text.strip()}\n"
+        except Exception as e:
+            # Note: Your error message "OCR failed..." is visible in the console output.
+            print(f"OCR failed for {filepath}: {e}")
 
-    caption_text = generate_image_caption_gemini(filepath)
+        caption_text = caption_future.result()
     if caption_text:
         caption_text = f"Visual Description (Gemini): {caption_text.strip()}"
 
-    combined_content = f"--- Image Analysis for {filepath.split(os.sep)[-1]} ---\n"
+    filename = os.path.basename(filepath)
+    combined_content = f"--- Image Analysis for {filename} ---\n"
     combined_content += f"{ocr_text}\n{caption_text}"
     
     if not ocr_text.strip() and not caption_text.strip():
         print(f"Skipping {filepath}: Could not extract any useful text.")
         return []
         
-    filename = filepath.split(os.sep)[-1]
     metadata = {'source': filename, 'type': 'image_analysis'}
     
     document = Document(
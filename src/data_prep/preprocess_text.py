@@ -1,47 +1,70 @@
-from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.node_parser import TokenTextSplitter
 from llama_index.core.schema import Document
+from pathlib import Path
 import os
 import uuid 
+import hashlib
+from src.data_prep.hashing import hash_file_content
+from src.data_prep.ingested import is_already_ingested
+
+# Token-window splitter counting with tiktoken (Rust-backed), built once per process
+TEXT_SPLITTER = TokenTextSplitter(
+    chunk_size=1000, 
+    chunk_overlap=200,
+)
+
+# Namespace bytes are mixed into every chunk hash (computed once at import)
+_ID_NAMESPACE = uuid.NAMESPACE_DNS.bytes
+
+def make_chunk_id(base_id: str, start_index: int) -> str:
+    """
+    Returns a deterministic chunk ID from the file's content-derived ID and the chunk's
+    start offset. Uses a 16-byte BLAKE2b digest rendered in UUID form, matching the format
+    of the audio/image IDs. Qdrant point IDs are assigned separately by the node parser
+    during ingestion.
+    """
+    h = hashlib.blake2b(
+        _ID_NAMESPACE + base_id.encode() + start_index.to_bytes(8, 'little'),
+        digest_size=16
+    ).hexdigest()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
 
 def get_text_chunks_from_text(text: str, source_metadata: dict) -> list[Document]:
     """
     Splits raw text into smaller chunks and assigns a unique, deterministic ID 
-    based on the source and the chunk's start index to enable upserting.
+    based on the file's 'id' metadata and the chunk's start index. The file-level 'id'
+    stays in every chunk's metadata (as for image/audio) for the already-ingested check.
     """
-    text_splitter = SentenceSplitter(
-        chunk_size=1000, 
-        chunk_overlap=200,
-    )
-    
     full_doc = Document(text=text, metadata=source_metadata)
     
-    # This ensures start_char_idx metadata is present
-    documents = text_splitter.get_nodes_from_documents([full_doc])
+    # This ensures each node's start_char_idx is populated
+    documents = TEXT_SPLITTER.get_nodes_from_documents([full_doc])
     
-    # 🟢 CRITICAL FIX: Generate deterministic ID using source + start index
+    # 🟢 CRITICAL FIX: Generate deterministic ID using file ID + start index
+    base_id = source_metadata['id']
     for doc in documents:
-        # Combine source name and the chunk's starting index
-        start_index = doc.metadata.get('start_char_idx', '0')
-        unique_string = f"{doc.metadata.get('source')}_{start_index}"
-        
-        # uuid.uuid5 creates a UUID based on the hash of the unique_string
-        doc_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, unique_string))
-        
-        doc.id_ = doc_id
-        doc.metadata['id'] = doc_id 
+        # Combine the file ID and the chunk's starting index
+        doc.id_ = make_chunk_id(base_id, doc.start_char_idx or 0)
     
     return documents
 
 def process_text_file(filepath: str) -> list[Document]:
-    """Reads a file and returns processed documents/chunks."""
+    """Reads a file and returns processed documents/chunks, or [] if it is already ingested."""
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        filename = filepath.split(os.sep)[-1] 
-        metadata = {'source': filename, 'type': 'text'}
+        # Stable ID from the file content, so edited files are re-ingested
+        file_hash = hash_file_content(filepath)
+        deterministic_base_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, file_hash))
+        filename = os.path.basename(filepath) 
+
+        # Without this, every run would upsert another copy of each chunk
+        if is_already_ingested(deterministic_base_id, filename):
+            print(f"Skipping {filepath}: already ingested.")
+            return []
+
+        content = Path(filepath).read_text(encoding='utf-8')
+        metadata = {'source': filename, 'type': 'text', 'id': deterministic_base_id}
         
         return get_text_chunks_from_text(content, metadata)
     except Exception as e:
         print(f"Error processing text file {filepath}: {e}")
-        return []
\ No newline at end of file
+        return []
@@ -1,15 +1,18 @@
 # src/ingestion/ingest_data.py (formerly create_embeddings.py)
 
 import os
+import multiprocessing
 from glob import glob
-from qdrant_client import QdrantClient
-from llama_index.vector_stores.qdrant import QdrantVectorStore # 🟢 Qdrant Connector
-from llama_index.core import VectorStoreIndex # 🟢 LlamaIndex Index
+from itertools import islice
+from typing import Iterable, Iterator
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from llama_index.core.schema import Document # 🟢 LlamaIndex Document
-from llama_index.core.storage.storage_context import StorageContext # 🟢 Storage Context
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding # 🟢 LlamaIndex Embedding
 from dotenv import load_dotenv
 
+# NOTE: qdrant_client, the vector store, the ingestion pipeline and the embedding backends
+# (torch, sentence_transformers, onnxruntime) are imported inside the functions that use them.
+# Spawned preprocessing workers re-import this module, and they only need the functions below.
+
 # Import all preprocessing functions
 from src.data_prep.preprocess_text import process_text_file
 from src.data_prep.preprocess_image import process_image_file
@@ -21,82 +24,168 @@ load_dotenv(dotenv_path=ENV_PATH)
 
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME")
+# gRPC is opt-in: it needs the gRPC port (6334 by default) published alongside 6333
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
 # Using the same embedding model for consistency with your previous code
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2" 
 PERSIST_DIR = "./data/db" # Directory for LlamaIndex to persist metadata
+# Int8 ONNX Runtime embeddings; must match the setting used by src/query_data.py
+USE_INT8_EMBEDDINGS = os.getenv("USE_INT8_EMBEDDINGS", "false").lower() == "true"
+EMBEDDING_DIM = 384 # all-MiniLM-L6-v2 output size
+GPU_EMBED_BATCH_SIZE = 256
+CPU_EMBED_BATCH_SIZE = 64
+PREPROCESS_MAX_PROCESSES = min(os.cpu_count() or 1, 8) # Text/image worker processes
+AUDIO_MAX_WORKERS = 16 # Audio is I/O-bound on AssemblyAI uploads
+INGEST_BATCH_SIZE = 64 # Documents embedded and upserted per pipeline run
+
+# Shared Qdrant client (with QDRANT_PREFER_GRPC, requests multiplex over one HTTP/2 connection).
+# Created once by initialize_qdrant_client.
+QDRANT = None
 
-def initialize_qdrant_client() -> QdrantClient:
-    """Initializes and returns the Qdrant client."""
+def initialize_qdrant_client():
+    """Verifies the connection and returns the shared Qdrant client."""
+    global QDRANT
     if not QDRANT_URL:
         raise ValueError("QDRANT_URL not found in environment variables. Check 'config/.env'.")
     try:
-        # Qdrant client connection (Qdrant client is standard)
-        client = QdrantClient(url=QDRANT_URL)
-        client.get_collections()
-        return client
+        if QDRANT is None:
+            from qdrant_client import QdrantClient
+            QDRANT = QdrantClient(url=QDRANT_URL, prefer_grpc=QDRANT_PREFER_GRPC, grpc_port=QDRANT_GRPC_PORT, timeout=30)
+        QDRANT.get_collections()
+        return QDRANT
     except Exception as e:
         print(f"Error connecting to Qdrant at {QDRANT_URL}: {e}")
         print("ACTION REQUIRED: Ensure the Qdrant Docker container is running.")
         exit(1)
 
-def collect_all_documents() -> list[Document]:
+def initialize_embed_model():
+    """
+    Returns the ingestion embedding model, batched on GPU (FP16) when CUDA is available
+    and falling back to CPU otherwise. With USE_INT8_EMBEDDINGS, an int8 ONNX model is used.
+    """
+    from llama_index.embeddings.huggingface import HuggingFaceEmbedding # 🟢 LlamaIndex Embedding
+    from src.onnx_embedding import QuantizedONNXEmbedding
+
+    try:
+        import torch
+        use_cuda = torch.cuda.is_available()
+    except ImportError:
+        use_cuda = False
+
+    if USE_INT8_EMBEDDINGS:
+        # Dynamically quantized ops (MatMulInteger, DynamicQuantizeLinear) only run on the CPU EP
+        return QuantizedONNXEmbedding(
+            model_name=EMBEDDING_MODEL_NAME,
+            providers=["CPUExecutionProvider"],
+            embed_batch_size=CPU_EMBED_BATCH_SIZE
+        )
+
+    if not use_cuda:
+        return HuggingFaceEmbedding(
+            model_name=EMBEDDING_MODEL_NAME,
+            device="cpu",
+            embed_batch_size=CPU_EMBED_BATCH_SIZE
+        )
+
+    # Half precision halves memory bandwidth and uses tensor cores on GPU
+    return HuggingFaceEmbedding(
+        model_name=EMBEDDING_MODEL_NAME,
+        device="cuda",
+        embed_batch_size=GPU_EMBED_BATCH_SIZE,
+        model_kwargs={"torch_dtype": torch.float16}
+    )
+
+def collect_all_documents() -> Iterator[Document]:
     """
     Finds and processes all text, image, and audio files in the data/raw directory.
+    Files are processed concurrently and their documents are yielded as each file finishes.
     """
-    # (Document collection logic remains unchanged)
-    all_documents = []
-    # 1. Process Text Files
     text_files = glob("data/raw/text/*.txt")
     print(f"-> Found {len(text_files)} text files.")
-    for filepath in text_files:
-        all_documents.extend(process_text_file(filepath))
-    
-    # 2. Process Image Files
     image_files = glob("data/raw/images/*.png") + glob("data/raw/images/*.jpg") + glob("data/raw/images/*.jpeg")
     print(f"-> Found {len(image_files)} image files.")
-    for filepath in image_files:
-        all_documents.extend(process_image_file(filepath))
-        
-    # 3. Process Audio Files
     audio_files = glob("data/raw/audio/*.mp3") + glob("data/raw/audio/*.wav")
     print(f"-> Found {len(audio_files)} audio files.")
-    for filepath in audio_files:
-        all_documents.extend(process_audio_file(filepath))
-        
-    print(f"\nCollected a total of {len(all_documents)} documents/chunks for ingestion.")
-    return all_documents
 
-def store_documents_qdrant(documents: list[Document]) -> VectorStoreIndex:
+    # Workers are spawned rather than forked: the parent already holds a gRPC channel
+    # and possibly CUDA state, neither of which survives a fork
+    spawn_ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=PREPROCESS_MAX_PROCESSES, mp_context=spawn_ctx) as cpu_pool, \
+            ThreadPoolExecutor(max_workers=AUDIO_MAX_WORKERS) as io_pool:
+        # 1. Text and Image Files (CPU-bound chunking/OCR) in worker processes
+        futures = [cpu_pool.submit(process_text_file, f) for f in text_files]
+        futures += [cpu_pool.submit(process_image_file, f) for f in image_files]
+        # 2. Audio Files (network-bound transcription) in threads
+        futures += [io_pool.submit(process_audio_file, f) for f in audio_files]
+
+        for future in as_completed(futures):
+            yield from future.result()
+
+def store_documents_qdrant(documents: Iterable[Document]):
     """
-    Stores the LlamaIndex Documents into the Qdrant collection using a VectorStoreIndex.
+    Streams the LlamaIndex Documents into the Qdrant collection in batches, so embedding
+    and upserting overlap with preprocessing, then persists and returns the VectorStoreIndex.
+    Returns None if no documents were produced.
     """
+    from qdrant_client.models import (
+        VectorParams, Distance, HnswConfigDiff,
+        ScalarQuantization, ScalarQuantizationConfig, ScalarType
+    )
+    from llama_index.vector_stores.qdrant import QdrantVectorStore # 🟢 Qdrant Connector
+    from llama_index.core import VectorStoreIndex # 🟢 LlamaIndex Index
+    from llama_index.core.ingestion import IngestionPipeline # 🟢 Streaming embed + upsert
+    from llama_index.core.node_parser import SentenceSplitter
+
     qdrant_client = initialize_qdrant_client()
     
-    # 1. LlamaIndex HuggingFace Embedding Model
-    embed_model = HuggingFaceEmbedding(model_name=EMBEDDING_MODEL_NAME)
+    # 1. LlamaIndex HuggingFace Embedding Model (batched, GPU when available)
+    embed_model = initialize_embed_model()
     
     # 2. Configure the Qdrant Vector Store
+    # On first ingestion the collection is created with int8 scalar quantization kept in RAM
+    # (FP32 originals stay on disk for rescoring) and a denser HNSW graph
     vector_store = QdrantVectorStore(
         client=qdrant_client, 
-        collection_name=QDRANT_COLLECTION_NAME
+        collection_name=QDRANT_COLLECTION_NAME,
+        dense_config=VectorParams(
+            size=EMBEDDING_DIM,
+            distance=Distance.COSINE,
+            on_disk=True,
+            hnsw_config=HnswConfigDiff(m=32, ef_construct=256)
+        ),
+        quantization_config=ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        ),
+        # Keyword indexes for the already-ingested check and the per-file retrieval filter
+        payload_indexes=[
+            {"field_name": "id", "field_schema": "keyword"},
+            {"field_name": "source", "field_schema": "keyword"}
+        ]
     )
 
-    # 3. Configure the Storage Context
-    # This tells LlamaIndex where to store its internal mappings/metadata
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
-    
-    # 4. Create the Index (This handles chunking, embedding, and upserting)
-    # LlamaIndex will automatically use the IDs (id_) you set in the Document objects
-    # to perform an upsert, preventing duplicate ingestion.
-    print(f"Creating/Upserting index for {len(documents)} documents...")
-    index = VectorStoreIndex.from_documents(
-        documents, 
-        storage_context=storage_context, 
-        embed_model=embed_model,
-        show_progress=True
+    # 3. Configure the Pipeline (same chunking as VectorStoreIndex.from_documents, then embed + upsert)
+    # The default in-memory cache would retain every embedded node for the whole run
+    pipeline = IngestionPipeline(
+        transformations=[SentenceSplitter(), embed_model],
+        vector_store=vector_store,
+        disable_cache=True
     )
     
+    # 4. Run the Pipeline one batch at a time as documents become available
+    documents = iter(documents)
+    total_documents = 0
+    while batch := list(islice(documents, INGEST_BATCH_SIZE)):
+        pipeline.run(nodes=batch)
+        total_documents += len(batch)
+        print(f"-> Upserted {total_documents} documents/chunks so far...")
+
+    if not total_documents:
+        return None
+    print(f"\nIngested a total of {total_documents} documents/chunks.")
+
     # 5. Persist LlamaIndex metadata to local disk
+    index = VectorStoreIndex.from_vector_store(vector_store, embed_model=embed_model)
     if not os.path.exists(PERSIST_DIR):
         os.makedirs(PERSIST_DIR)
     index.storage_context.persist(persist_dir=PERSIST_DIR)
@@ -107,11 +196,8 @@ def store_documents_qdrant(documents: list[Document]) -> VectorStoreIndex:
 if __name__ == "__main__":
     print("--- STARTING MULTI-MODAL DATA INGESTION (LlamaIndex) ---")
     
-    # 1. Collect and Process all documents
-    all_docs = collect_all_documents()
+    # Collect, process, and store documents in Qdrant as they are produced
+    index = store_documents_qdrant(collect_all_documents())
     
-    if all_docs:
-        # 2. Store documents in Qdrant and persist index metadata
-        store_documents_qdrant(all_docs)
-    else:
-        print("No documents found in data/raw directories. Ingestion skipped.")
\ No newline at end of file
+    if index is None:
+        print("Nothing new to ingest (no files in data/raw, or all were already ingested). Ingestion skipped.")
\ No newline at end of file
@@ -0,0 +1,119 @@
+# src/onnx_embedding.py
+
+import os
+import shutil
+import tempfile
+from typing import Any, List, Optional
+import numpy as np
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+ONNX_MODEL_DIR = "./data/models/minilm-onnx-int8" # Exported + quantized model cache
+QUANTIZED_MODEL_FILE = "model_quantized.onnx"
+MAX_SEQ_LENGTH = 256 # Same truncation as the sentence-transformers MiniLM config
+
+def export_quantized_onnx(model_name: str, output_dir: str = ONNX_MODEL_DIR) -> str:
+    """
+    Exports the HuggingFace model to ONNX and applies dynamic int8 weight quantization.
+    Returns the path of the quantized model; skips the work if it already exists.
+    The export is built in a temporary directory and renamed into place, so concurrent
+    callers (e.g. several API workers) never see a half-written model.
+    """
+    quantized_path = os.path.join(output_dir, QUANTIZED_MODEL_FILE)
+    if os.path.exists(quantized_path):
+        return quantized_path
+
+    # Export-time only dependencies
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    from transformers import AutoTokenizer
+
+    print(f"Exporting {model_name} to ONNX (int8) in {output_dir}...")
+    parent_dir = os.path.dirname(os.path.abspath(output_dir))
+    os.makedirs(parent_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".onnx-export-", dir=parent_dir)
+    try:
+        ORTModelForFeatureExtraction.from_pretrained(model_name, export=True).save_pretrained(tmp_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(tmp_dir)
+
+        quantize_dynamic(
+            os.path.join(tmp_dir, "model.onnx"),
+            os.path.join(tmp_dir, QUANTIZED_MODEL_FILE),
+            weight_type=QuantType.QInt8
+        )
+
+        # Atomic on the same filesystem; fails if another process already published it
+        try:
+            os.replace(tmp_dir, output_dir)
+        except OSError:
+            if not os.path.exists(quantized_path):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return quantized_path
+
+
+class QuantizedONNXEmbedding(BaseEmbedding):
+    """
+    Int8-quantized ONNX Runtime drop-in for HuggingFaceEmbedding on sentence-transformers
+    models (mean pooling + L2 normalization, matching all-MiniLM-L6-v2).
+    """
+    model_dir: str = ONNX_MODEL_DIR
+
+    _session: Any = PrivateAttr()
+    _tokenizer: Any = PrivateAttr()
+    _input_names: List[str] = PrivateAttr()
+
+    def __init__(
+        self,
+        model_name: str,
+        model_dir: str = ONNX_MODEL_DIR,
+        providers: Optional[List[str]] = None,
+        **kwargs: Any,
+    ):
+        super().__init__(model_name=model_name, model_dir=model_dir, **kwargs)
+
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_path = export_quantized_onnx(model_name, model_dir)
+        self._session = ort.InferenceSession(
+            model_path,
+            providers=providers or ["CPUExecutionProvider"]
+        )
+        self._tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self._input_names = [i.name for i in self._session.get_inputs()]
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "QuantizedONNXEmbedding"
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        encoded = self._tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=MAX_SEQ_LENGTH,
+            return_tensors="np"
+        )
+        feeds = {name: encoded[name].astype(np.int64) for name in self._input_names}
+        token_embeddings = self._session.run(None, feeds)[0]
+
+        # Mean pooling over non-padding tokens, then L2 normalize
+        mask = np.expand_dims(encoded["attention_mask"], -1).astype(token_embeddings.dtype)
+        summed = (token_embeddings * mask).sum(axis=1)
+        pooled = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled.tolist()
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._embed([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._embed([text])[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts)
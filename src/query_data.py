@@ -1,14 +1,10 @@
 # src/query_data.py
 
 import os
+import threading
+import functools
 from typing import List, Dict, Any, Optional
 import contextlib # 🟢 MOVED IMPORT TO THE TOP
-from llama_index.core import StorageContext, load_index_from_storage
-from llama_index.vector_stores.qdrant import QdrantVectorStore
-from llama_index.llms.gemini import Gemini
-from llama_index.embeddings.huggingface import HuggingFaceEmbedding
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
 from dotenv import load_dotenv
 
 # --- CONFIGURATION & ENV LOADING ---
@@ -17,38 +13,68 @@ load_dotenv(dotenv_path=ENV_PATH)
 
 QDRANT_URL = os.getenv("QDRANT_URL")
 QDRANT_COLLECTION_NAME = os.getenv("QDRANT_COLLECTION_NAME")
+# gRPC is opt-in: it needs the gRPC port (6334 by default) published alongside 6333
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", "6334"))
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 PERSIST_DIR = "./data/db"
 
 EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2" 
 LLM_MODEL = "gemini-2.5-pro" 
+# Must match the backend used at ingestion time (see src/ingestion/ingest_data.py)
+USE_INT8_EMBEDDINGS = os.getenv("USE_INT8_EMBEDDINGS", "false").lower() == "true"
+LLM_CACHE_SIZE = 512 # Max cached (system instruction, prompt) -> response entries
+MAX_CHUNK_CHARS = 4000 # Per-chunk content budget sent to Gemini (~1000 tokens)
 
-# Global client variables for manual Gemini call
+# Shared Qdrant client (with QDRANT_PREFER_GRPC, retrievals multiplex over one HTTP/2 connection).
+# Created once by initialize_rag_components.
+QDRANT = None
+
+# Cached (index, llm) pair, built once per process on first query
+_RAG_STATE = None
+_RAG_LOCK = threading.Lock()
+
+# Global client variables for manual Gemini call (created on first use, see _get_gemini_client)
 AI_CLIENT = None
 GEMINI_CLIENT = None
+_GEMINI_LOCK = threading.Lock()
 
-try:
-    import google.genai
-    from google.genai.errors import APIError as GeminiAPIError
-    from google.genai import types
-    if GEMINI_API_KEY:
-        GEMINI_CLIENT = google.genai.Client(api_key=GEMINI_API_KEY)
-        AI_CLIENT = "gemini"
-except ImportError:
-    pass 
+# NOTE: llama_index, qdrant_client, Gemini, google.genai and the embedding backends are
+# imported lazily inside the functions that use them, so importing this module
+# (e.g. at API server boot) stays cheap.
+
+def _get_gemini_client():
+    """Returns the Gemini client, creating it on first use. Returns None if unavailable."""
+    global GEMINI_CLIENT, AI_CLIENT
+    if GEMINI_CLIENT is None and GEMINI_API_KEY:
+        with _GEMINI_LOCK:
+            if GEMINI_CLIENT is None:
+                try:
+                    import google.genai
+                except ImportError:
+                    return None
+                GEMINI_CLIENT = google.genai.Client(api_key=GEMINI_API_KEY)
+                AI_CLIENT = "gemini"
+    return GEMINI_CLIENT
 
 # ----------------------------------------------------------------------
 # 1. LlamaIndex Initialization (Load Index and Retriever)
 # ----------------------------------------------------------------------
 def initialize_rag_components(llm_model: str, embed_model_name: str):
     """Initializes and returns the LlamaIndex Index and LLM."""
+    global QDRANT
     if not QDRANT_URL or not GEMINI_API_KEY:
         raise ValueError("QDRANT_URL or GEMINI_API_KEY not found in environment variables.")
 
-    # 1. Initialize Qdrant Client and Vector Store
-    qdrant_client = QdrantClient(url=QDRANT_URL)
+    from llama_index.core import StorageContext, load_index_from_storage
+    from llama_index.vector_stores.qdrant import QdrantVectorStore
+    from qdrant_client import QdrantClient
+
+    # 1. Create the shared Qdrant Client for the Vector Store
+    if QDRANT is None:
+        QDRANT = QdrantClient(url=QDRANT_URL, prefer_grpc=QDRANT_PREFER_GRPC, grpc_port=QDRANT_GRPC_PORT, timeout=30)
     vector_store = QdrantVectorStore(
-        client=qdrant_client, 
+        client=QDRANT, 
         collection_name=QDRANT_COLLECTION_NAME
     )
     
@@ -57,75 +83,112 @@ def initialize_rag_components(llm_model: str, embed_model_name: str):
         vector_store=vector_store, 
         persist_dir=PERSIST_DIR
     )
+    if USE_INT8_EMBEDDINGS:
+        from src.onnx_embedding import QuantizedONNXEmbedding
+        embed_model = QuantizedONNXEmbedding(model_name=embed_model_name)
+    else:
+        from llama_index.embeddings.huggingface import HuggingFaceEmbedding
+        embed_model = HuggingFaceEmbedding(model_name=embed_model_name)
+
     # Suppress output during index loading
     with open(os.devnull, 'w') as f, contextlib.redirect_stdout(f):
         index = load_index_from_storage(
             storage_context=storage_context,
-            embed_model=HuggingFaceEmbedding(model_name=embed_model_name)
+            embed_model=embed_model
         )
     
     # 3. Configure the LLM for direct API calls
+    from llama_index.llms.gemini import Gemini
     llm = Gemini(model=llm_model, api_key=GEMINI_API_KEY)
     
     return index, llm
 
+def _get_rag():
+    """Returns the cached (index, llm) pair, initializing it on first use."""
+    global _RAG_STATE
+    if _RAG_STATE is None:
+        with _RAG_LOCK:
+            if _RAG_STATE is None:
+                _RAG_STATE = initialize_rag_components(LLM_MODEL, EMBEDDING_MODEL_NAME)
+    return _RAG_STATE
+
 
 # ----------------------------------------------------------------------
 # 2. Adaptive LLM Generation Function
 # ----------------------------------------------------------------------
+# Persona instructions and the shared response structure are constant, so the complete
+# system instructions and the user prompt template are built once at import
+_RESPONSE_STRUCTURE = (
+    "Your response MUST be strictly structured using Markdown bolding for the three requested section titles below, "
+    "and must only contain the structure and content.\n"
+    "1. **Clinical Explanation and Summary**\n"
+    "2. **Problem/Diagnosis and Cause**\n"
+    "3. **Recommended Intervention and Risks**\n"
+    "Base your analysis ONLY on the CONTEXT provided."
+)
+
+_SYSTEM_INSTRUCTIONS = {
+    # Professional, technical, uses advanced medical terminology
+    'DOCTOR': (
+        "You are a Chief Medical Officer (CMO) performing a rapid, definitive assessment. "
+        "Your audience is a medical specialist. Use precise technical terminology (e.g., myalgia, iatrogenic hyperthyroidism, vasogenic edema). "
+        "You must state a definite diagnosis, cause, and concrete intervention based on the most likely clinical inference. "
+        "FORBIDDEN phrases: 'cannot be established,' 'undetermined,' 'non-specific,' or 'requires further investigation.' "
+        + _RESPONSE_STRUCTURE
+    ),
+    # Layman, simple language, focuses on symptoms and easily understood interventions
+    'PATIENT': (
+        "You are a caring medical explainer (CMO persona) speaking directly to the patient. "
+        "Use clear, simple, and empathetic language. Explain all medical terms using everyday words (e.g., 'Hypothyroidism' should be explained as 'Your body's master gland is running too slow'). "
+        "Your output must be reassuring but accurate, focusing on what the patient needs to know and do. "
+        + _RESPONSE_STRUCTURE
+    ),
+}
+
+USER_PROMPT_TMPL = (
+    "Analyze the context from the file '{src}' to address the user request: '{q}'. "
+    "Begin your response immediately with the first structured section title. Adhere strictly to the requested persona.\n\n"
+    "--- CONTEXT FOR ANALYSIS ---\n{ctx}"
+)
+
+CHUNK_TMPL = "Source: {src} (Type: {modality}, Score: {score:.4f})\nContent: {content}"
+CHUNK_SEPARATOR = "\n\n--- Retrieved Chunk ---\n\n"
+
 def get_system_instruction(persona: str) -> str:
-    """Returns the appropriate system instruction based on the desired persona."""
-    if persona == 'DOCTOR':
-        # Professional, technical, uses advanced medical terminology
-        return (
-            "You are a Chief Medical Officer (CMO) performing a rapid, definitive assessment. "
-            "Your audience is a medical specialist. Use precise technical terminology (e.g., myalgia, iatrogenic hyperthyroidism, vasogenic edema). "
-            "You must state a definite diagnosis, cause, and concrete intervention based on the most likely clinical inference. "
-            "FORBIDDEN phrases: 'cannot be established,' 'undetermined,' 'non-specific,' or 'requires further investigation.' "
-        )
-    else: # Defaulting to PATIENT
-        # Layman, simple language, focuses on symptoms and easily understood interventions
-        return (
-            "You are a caring medical explainer (CMO persona) speaking directly to the patient. "
-            "Use clear, simple, and empathetic language. Explain all medical terms using everyday words (e.g., 'Hypothyroidism' should be explained as 'Your body's master gland is running too slow'). "
-            "Your output must be reassuring but accurate, focusing on what the patient needs to know and do. "
+    """Returns the complete system instruction for the desired persona (defaults to PATIENT)."""
+    return _SYSTEM_INSTRUCTIONS.get(persona, _SYSTEM_INSTRUCTIONS['PATIENT'])
+
+@functools.lru_cache(maxsize=LLM_CACHE_SIZE)
+def _generate_cached(system_instruction: str, user_prompt: str) -> str:
+    """
+    Calls Gemini and memoizes the response text. The persona is part of the system
+    instruction, so the key covers (query, context, persona). Exceptions propagate
+    and are therefore never cached.
+    """
+    from google.genai import types
+    response = GEMINI_CLIENT.models.generate_content(
+        model=LLM_MODEL, 
+        contents=[{"role": "user", "parts": [{"text": user_prompt}]}],
+        config=types.GenerateContentConfig(
+            system_instruction=system_instruction, 
+            temperature=0.3, 
         )
+    )
+    return response.text
 
 def call_llm_for_generation(query: str, context: str, source_file: str, persona: str) -> str:
     """
     Calls the Gemini model with an adaptive persona and forces a definite conclusion.
     """
-    if GEMINI_CLIENT is None or AI_CLIENT != "gemini":
+    if _get_gemini_client() is None or AI_CLIENT != "gemini":
         return "🛑 ERROR: Gemini client not active. Cannot generate structured response."
+    from google.genai.errors import APIError as GeminiAPIError
     
-    system_instruction_core = get_system_instruction(persona)
-
-    system_instruction = (
-        system_instruction_core +
-        "Your response MUST be strictly structured using Markdown bolding for the three requested section titles below, "
-        "and must only contain the structure and content.\n"
-        "1. **Clinical Explanation and Summary**\n"
-        "2. **Problem/Diagnosis and Cause**\n"
-        "3. **Recommended Intervention and Risks**\n"
-        "Base your analysis ONLY on the CONTEXT provided."
-    )
-    
-    user_prompt = (
-        f"Analyze the context from the file '{source_file}' to address the user request: '{query}'. "
-        f"Begin your response immediately with the first structured section title. Adhere strictly to the requested persona.\n\n"
-        f"--- CONTEXT FOR ANALYSIS ---\n{context}"
-    )
+    system_instruction = get_system_instruction(persona)
+    user_prompt = USER_PROMPT_TMPL.format(src=source_file, q=query, ctx=context)
     
     try:
-        response = GEMINI_CLIENT.models.generate_content(
-            model=LLM_MODEL, 
-            contents=[{"role": "user", "parts": [{"text": user_prompt}]}],
-            config=types.GenerateContentConfig(
-                system_instruction=system_instruction, 
-                temperature=0.3, 
-            )
-        )
-        return response.text
+        return _generate_cached(system_instruction, user_prompt)
         
     except GeminiAPIError as e: 
         return f"\n[Gemini API Error]: Failed to generate response. Error: {e}"
@@ -138,6 +201,7 @@ def call_llm_for_generation(query: str, context: str, source_file: str, persona:
 # ----------------------------------------------------------------------
 def retrieve_targeted_context(index, user_query: str, target_filename: str, top_k: int = 20):
     """Retrieves context from the LlamaIndex index, filtered by a specific source file."""
+    from qdrant_client.models import Filter, FieldCondition, MatchValue, SearchParams, QuantizationSearchParams
     
     qdrant_filter = Filter(
         must=[
@@ -148,9 +212,16 @@ def retrieve_targeted_context(index, user_query: str, target_filename: str, top_
         ]
     )
     
+    # Search the int8 quantized vectors, oversampling 2x and rescoring with the originals
+    search_params = SearchParams(
+        quantization=QuantizationSearchParams(rescore=True, oversampling=2.0)
+    )
+    
+    # QdrantVectorStore.query reads the native filter from the 'qdrant_filters' kwarg,
+    # so the search itself is restricted and top_k hits all come from the target file
     retriever = index.as_retriever(
         similarity_top_k=top_k,
-        vector_store_kwargs={"query_filter": qdrant_filter} 
+        vector_store_kwargs={"qdrant_filters": qdrant_filter, "search_params": search_params} 
     )
     
     nodes = retriever.retrieve(user_query)
@@ -167,40 +238,29 @@ def run_rag_query(user_query: str, file_path: str, persona: str, top_k: int = 20
     and source nodes for UI display.
     """
     
-    index, llm = initialize_rag_components(LLM_MODEL, EMBEDDING_MODEL_NAME)
+    index, llm = _get_rag()
     
     # 1. Normalize path and extract ONLY the filename
     target_filename = os.path.basename(file_path)
     
-    # 2. Retrieve Context (LlamaIndex + Qdrant Filter)
+    # 2. Retrieve Context (LlamaIndex + server-side Qdrant Filter)
     nodes = retrieve_targeted_context(index, user_query, target_filename, top_k)
     
-    # 3. CRITICAL FIX: AGGRESSIVELY FILTER NODES
-    strictly_filtered_nodes = []
-    
-    for node in nodes:
-        if node.metadata.get('source') == target_filename:
-            strictly_filtered_nodes.append(node)
-    
-    nodes = strictly_filtered_nodes # Use the strictly filtered list
-    
     if not nodes:
         aggregated_context = f"No context retrieved from the targeted file: {target_filename}. Cannot generate analysis."
     else:
-        # 4. Aggregate Context
-        context_list = []
-        for node in nodes:
-            source_file = node.metadata.get('source', 'N/A')
-            modality = node.metadata.get('type', 'unknown')
-            
-            context_list.append(
-                f"Source: {source_file} (Type: {modality}, Score: {node.score:.4f})\n"
-                f"Content: {node.get_content().strip()}"
+        # 3. Aggregate Context in a single pass, capping each chunk to the char budget
+        aggregated_context = CHUNK_SEPARATOR.join(
+            CHUNK_TMPL.format(
+                src=node.metadata.get('source', 'N/A'),
+                modality=node.metadata.get('type', 'unknown'),
+                score=node.score,
+                content=node.get_content().strip()[:MAX_CHUNK_CHARS]
             )
-        
-        aggregated_context = "\n\n--- Retrieved Chunk ---\n\n".join(context_list)
+            for node in nodes
+        )
     
-    # 5. Generate Structured Summary
+    # 4. Generate Structured Summary
     final_answer = call_llm_for_generation(user_query, aggregated_context, target_filename, persona)
 
     # 🟢 API CHANGE: Return final_answer and nodes